@@ -1,35 +1,123 @@
 import streamlit as st
+import gc
+import io
 import os
 import logging
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from docx import Document
-import re
-
-from translate_script import (
-    extract_text,
-    translate_text_google,
-    chunk_paragraphs,
-    translate_chunk_openai,
-    create_translation_table,
-    setup_document_orientation,
-    add_title,
-    sanitize_filename # Переконайтесь, що ця функція є у translate_script.py або визначена тут
-)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
 st.set_page_config(page_title="LegalTransUA", layout="wide")
 
-TEMP_DIR = "temp"
-if not os.path.exists(TEMP_DIR):
-    os.makedirs(TEMP_DIR)
+# Мінімальний інтервал (с) між оновленнями індикаторів прогресу
+PROGRESS_UPDATE_INTERVAL = 0.1
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_extract(file_bytes: bytes, name: str):
+    """Витягує абзаци із завантаженого файлу в пам'яті; результат кешується за вмістом файлу."""
+    from translate_script import extract_text
+    return extract_text(io.BytesIO(file_bytes), name)
+
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def cached_extract_url(url: str):
+    """Витягує абзаци з веб-сторінки; результат кешується на годину."""
+    from translate_script import extract_text
+    return extract_text(url)
+
+
+def run_translation(paragraphs) -> bytes:
+    """
+    Перекладає абзаци через Google та OpenAI з індикаторами прогресу
+    і повертає готовий DOCX із таблицею порівняння у вигляді байтів.
+    """
+    # Важкі залежності (python-docx, openai, PyMuPDF) імпортуються лише тут,
+    # щоб сторінки без перекладу відкривалися швидше.
+    from translate_script import (
+        translate_batch_google,
+        pack_paragraphs,
+        chunk_paragraphs,
+        translate_chunk_openai,
+        create_translation_table,
+        new_translation_document,
+        get_cached_translations,
+        deduplicate_paragraphs,
+        GOOGLE_BATCH_WORKERS,
+        GOOGLE_PACK_CHARS,
+        OPENAI_MAX_WORKERS,
+    )
+
+    # Перекладаємо лише унікальні абзаци, потім розкладаємо результати назад
+    unique_paragraphs, index_map = deduplicate_paragraphs(paragraphs)
+    google_progress = st.progress(0, text="Переклад Google Translate...")
+    openai_progress = st.progress(0, text="Переклад OpenAI...")
+
+    google_trans = get_cached_translations("google", unique_paragraphs)
+    pending_g = [i for i, t in enumerate(google_trans) if t is None]
+    if not pending_g:
+        google_progress.progress(1.0, text="Google Translate: 100%")
+    # Пакети складаються з індексів абзаців, яких немає в кеші
+    packs_g = [[pending_g[j] for j in pack] for pack in pack_paragraphs([unique_paragraphs[i] for i in pending_g], max_chars=GOOGLE_PACK_CHARS)]
+
+    openai_trans = get_cached_translations("openai", unique_paragraphs)
+    pending_o = [i for i, t in enumerate(openai_trans) if t is None]
+
+    # Google та OpenAI незалежні, тому обидва етапи виконуються одночасно;
+    # індикатори прогресу оновлюються з основного потоку.
+    with ThreadPoolExecutor(max_workers=GOOGLE_BATCH_WORKERS) as google_executor, ThreadPoolExecutor(max_workers=OPENAI_MAX_WORKERS) as openai_executor:
+        futures_g = {google_executor.submit(translate_batch_google, [unique_paragraphs[i] for i in pack]): pack for pack in packs_g}
+        # Шматки складаються з індексів абзаців, яких немає в кеші, і надсилаються одразу
+        # під час нарізання; довжина шматка залежить від бюджету токенів,
+        # тому індекси відраховуються зі зсуву.
+        futures_o = {}
+        start = 0
+        for chunk in chunk_paragraphs([unique_paragraphs[i] for i in pending_o]):
+            futures_o[openai_executor.submit(translate_chunk_openai, chunk)] = pending_o[start:start + len(chunk)]
+            start += len(chunk)
+        total_chunks = len(futures_o)
+        if not total_chunks:
+            openai_progress.progress(1.0, text="OpenAI: 100%")
+
+        done_g = len(unique_paragraphs) - len(pending_g)
+        done_o = 0
+        last_update_g = last_update_o = 0.0
+        for future in as_completed([*futures_g, *futures_o]):
+            now = time.monotonic()
+            if future in futures_g:
+                pack = futures_g[future]
+                for i, translation in zip(pack, future.result()):
+                    google_trans[i] = translation
+                done_g += len(pack)
+                if now - last_update_g > PROGRESS_UPDATE_INTERVAL or done_g == len(unique_paragraphs):
+                    frac_g = done_g / len(unique_paragraphs)
+                    google_progress.progress(frac_g, text=f"Google Translate: {int(frac_g*100)}%")
+                    last_update_g = now
+            else:
+                for i, translation in zip(futures_o[future], future.result()):
+                    openai_trans[i] = translation
+                done_o += 1
+                if now - last_update_o > PROGRESS_UPDATE_INTERVAL or done_o == total_chunks:
+                    frac_o = done_o / total_chunks
+                    openai_progress.progress(frac_o, text=f"OpenAI: {int(frac_o*100)}%")
+                    last_update_o = now
+
+    google_trans = [google_trans[i] for i in index_map]
+    openai_trans = [openai_trans[i] for i in index_map]
+
+    doc = new_translation_document()
+    doc.add_paragraph(f"Дата та час перекладу: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    create_translation_table(doc, paragraphs, google_trans, openai_trans)
+
+    # Документ серіалізується в пам'ять і віддається без запису на диск
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    # Дерево великої таблиці звільняється до копіювання байтів для завантаження
+    del doc
+    gc.collect()
+    return buffer.getvalue()
 
-def save_uploaded_file(uploaded_file):
-    file_path = os.path.join(TEMP_DIR, uploaded_file.name)
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return file_path
 
 st.image("https://i.imgur.com/JmLIg6y.jpeg", width='stretch')
 
@@ -65,74 +153,41 @@ if check_password():
         st.write("Завантажте документ у форматі .docx або .pdf, або надайте посилання на веб-сторінку для одночасного перекладу двома системами.")
 
         type_of_source = st.radio("Оберіть тип джерела:", ["Завантажити файл", "Вказати URL"])
-        chunk_size = 5
 
         if type_of_source == "Завантажити файл":
             uploaded_file = st.file_uploader("Виберіть файл (DOCX або PDF):", type=["docx", "pdf"])
             if uploaded_file:
-                file_path = save_uploaded_file(uploaded_file)
                 st.success(f"Файл '{uploaded_file.name}' успішно завантажено.")
 
                 if st.button("Розпочати переклад"):
-                    # ... (вся логіка перекладу залишається незмінною)
-                    paragraphs = extract_text(file_path)
+                    paragraphs = cached_extract(uploaded_file.getvalue(), uploaded_file.name)
                     if not paragraphs:
                         st.warning("Не вдалося знайти текст у документі.")
                     else:
                         st.info(f"Знайдено {len(paragraphs)} абзаців для перекладу.")
 
-                        google_progress = st.progress(0, text="Переклад Google Translate...")
-                        google_trans = ["" for _ in paragraphs]
-                        with ThreadPoolExecutor(max_workers=5) as executor:
-                            futures_g = {executor.submit(translate_text_google, p): i for i, p in enumerate(paragraphs)}
-                            done_g = 0
-                            for future in as_completed(futures_g):
-                                idx = futures_g[future]
-                                google_trans[idx] = future.result()
-                                done_g += 1
-                                frac_g = done_g / len(paragraphs)
-                                google_progress.progress(frac_g, text=f"Google Translate: {int(frac_g*100)}%")
-
-                        openai_progress = st.progress(0, text="Переклад OpenAI...")
-                        openai_trans = [None] * len(paragraphs)
-                        all_chunks = list(chunk_paragraphs(paragraphs, chunk_size=chunk_size))
-                        total_chunks = len(all_chunks)
-                        for chunk_i, chunk in enumerate(all_chunks):
-                            chunk_result = translate_chunk_openai(chunk)
-                            chunk_start = chunk_i * chunk_size
-                            for j, translation in enumerate(chunk_result):
-                                openai_trans[chunk_start + j] = translation
-                            frac_o = (chunk_i + 1) / total_chunks
-                            openai_progress.progress(frac_o, text=f"OpenAI: {int(frac_o*100)}%")
-
-                        doc = Document()
-                        setup_document_orientation(doc)
-                        add_title(doc)
-                        doc.add_paragraph(f"Дата та час перекладу: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                        create_translation_table(doc, paragraphs, google_trans, openai_trans)
+                        docx_bytes = run_translation(paragraphs)
 
                         timestamp_str = datetime.now().strftime("%Y-%m-%d")
                         base_name = os.path.splitext(uploaded_file.name)[0]
+                        from translate_script import sanitize_filename
                         base_name = sanitize_filename(base_name)
                         output_filename = f"{base_name} (Translated by LTUA {timestamp_str}).docx"
-                        output_path = os.path.join(TEMP_DIR, output_filename)
-                        doc.save(output_path)
 
                         st.success("Переклад успішно завершено!")
-                        with open(output_path, "rb") as file:
-                            st.download_button(
-                                label="Завантажити результат (.docx)",
-                                data=file,
-                                file_name=output_filename,
-                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                            )
+                        st.download_button(
+                            label="Завантажити результат (.docx)",
+                            data=docx_bytes,
+                            file_name=output_filename,
+                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                        )
 
         elif type_of_source == "Вказати URL":
             url = st.text_input("Введіть посилання на веб-сторінку:")
             if url and st.button("Розпочати переклад"):
                 st.info(f"Аналізуємо сторінку за посиланням...")
                 try:
-                    paragraphs = extract_text(url)
+                    paragraphs = cached_extract_url(url)
                 except Exception as e:
                     st.error(f"Не вдалося обробити посилання: {e}")
                     paragraphs = []
@@ -141,50 +196,18 @@ if check_password():
                     st.warning("На сторінці не знайдено абзаців тексту для перекладу.")
                 else:
                     st.success(f"Знайдено {len(paragraphs)} абзаців для перекладу.")
-                    # ... (тут та сама логіка перекладу, що і для файлу)
-                    google_progress = st.progress(0, text="Переклад Google Translate...")
-                    google_trans = ["" for _ in paragraphs]
-                    with ThreadPoolExecutor(max_workers=5) as executor:
-                        futures_g = {executor.submit(translate_text_google, p): i for i, p in enumerate(paragraphs)}
-                        done_g = 0
-                        for future in as_completed(futures_g):
-                            idx = futures_g[future]
-                            google_trans[idx] = future.result()
-                            done_g += 1
-                            frac_g = done_g / len(paragraphs)
-                            google_progress.progress(frac_g, text=f"Google Translate: {int(frac_g*100)}%")
-
-                    openai_progress = st.progress(0, text="Переклад OpenAI...")
-                    openai_trans = [None] * len(paragraphs)
-                    all_chunks = list(chunk_paragraphs(paragraphs, chunk_size=chunk_size))
-                    total_chunks = len(all_chunks)
-                    for chunk_i, chunk in enumerate(all_chunks):
-                        chunk_result = translate_chunk_openai(chunk)
-                        chunk_start = chunk_i * chunk_size
-                        for j, translation in enumerate(chunk_result):
-                            openai_trans[chunk_start + j] = translation
-                        frac_o = (chunk_i + 1) / total_chunks
-                        openai_progress.progress(frac_o, text=f"OpenAI: {int(frac_o*100)}%")
-
-                    doc = Document()
-                    setup_document_orientation(doc)
-                    add_title(doc)
-                    doc.add_paragraph(f"Дата та час перекладу: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                    create_translation_table(doc, paragraphs, google_trans, openai_trans)
+                    docx_bytes = run_translation(paragraphs)
 
                     timestamp_str = datetime.now().strftime("%Y-%m-%d")
                     output_filename = f"Web-document (Translated by LTUA {timestamp_str}).docx"
-                    output_path = os.path.join(TEMP_DIR, output_filename)
-                    doc.save(output_path)
 
                     st.success("Переклад успішно завершено!")
-                    with open(output_path, "rb") as file:
-                        st.download_button(
-                            label="Завантажити результат (.docx)",
-                            data=file,
-                            file_name=output_filename,
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                        )
+                    st.download_button(
+                        label="Завантажити результат (.docx)",
+                        data=docx_bytes,
+                        file_name=output_filename,
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                    )
 
     elif section == "Про додаток":
         st.title("Про LegalTransUA")
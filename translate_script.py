@@ -1,24 +1,44 @@
+import functools
+import gc
+import hashlib
+import io
+import json
+import importlib.util
 import logging
+import multiprocessing
 import os
+import random
 import re
+import sqlite3
+import tempfile
+import threading
 import time
+import unicodedata
+import zipfile
 import requests
-import shutil
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import fitz  # PyMuPDF
-import docx
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.enum.section import WD_ORIENT
 from docx.shared import Pt, Inches
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from xml.sax.saxutils import escape
+from lxml import etree
 
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from bs4 import BeautifulSoup
-from deep_translator import GoogleTranslator
+from bs4 import BeautifulSoup, SoupStrainer
+try:
+    # selectolax (рушій lexbor) розбирає HTML значно швидше за BeautifulSoup
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
 
 import openai
 import streamlit as st
@@ -34,118 +54,860 @@ except Exception:
     # Fallback для локального тестування, якщо st.secrets недоступні
     api_key = os.getenv("OPENAI_API_KEY", "YOUR_KEY_HERE")
 
+# Спільний пул з'єднань httpx для всіх потоків; HTTP/2 (якщо встановлено h2)
+# мультиплексує паралельні запити через одне TLS-з'єднання.
+_OPENAI_HTTP_CLIENT = httpx.Client(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    timeout=httpx.Timeout(120.0, connect=10.0),
+)
+
+# Вбудовані повтори SDK вимкнено: повтори робить _request_openai_chat через
+# openai_limiter і openai_token_bucket, інакше вони множилися б і обходили ліміти.
 client = openai.OpenAI(
     base_url="https://openrouter.ai/api/v1",
-    api_key=api_key
+    api_key=api_key,
+    http_client=_OPENAI_HTTP_CLIENT,
+    max_retries=0,
 )
 
-# --- ДОПОМІЖНІ ФУНКЦІЇ ДЛЯ ТЕКСТУ ---
+# Модель OpenRouter (з префіксом виробника)
+OPENAI_MODEL = "openai/gpt-5-mini"
+
+# Кількість одночасних мережевих запитів до кожного сервісу перекладу.
+GOOGLE_BATCH_WORKERS = 3
+OPENAI_MAX_WORKERS = 5
+
+# Batch API (пакетна обробка зі знижкою 50%, до 24 год) працює лише з прямим API OpenAI,
+# тому для нього потрібен окремий ключ OPENAI_BATCH_API_KEY і модель без префікса виробника.
+OPENAI_BATCH_MODEL = OPENAI_MODEL.split("/")[-1]
+OPENAI_BATCH_POLL_INTERVAL = 30
+
+# Шматки для OpenAI формуються за кількістю вхідних токенів, а не абзаців;
+# кількість абзаців у шматку також обмежена, щоб нумерована відповідь лишалась надійною.
+OPENAI_CHUNK_TOKENS = 2000
+OPENAI_CHUNK_MAX_ITEMS = 40
+
+# Ліміт вихідних токенів рахується від розміру запиту: український переклад
+# приблизно в 1,5 раза довший у токенах; для reasoning-моделей (gpt-5-mini)
+# у max_completion_tokens входять і токени міркувань, тому додається резерв.
+OPENAI_COMPLETION_TOKENS_RATIO = 1.5
+OPENAI_REASONING_TOKENS = 2000
+OPENAI_MAX_COMPLETION_TOKENS = 16000
+
+# Максимальна частота запитів до публічного endpoint Google (запитів на секунду)
+GOOGLE_REQUESTS_PER_SECOND = 8
+# Максимальна частота запитів до OpenRouter (60 запитів на хвилину)
+OPENAI_REQUESTS_PER_SECOND = 1
+# Бюджет токенів OpenRouter на хвилину (вхідні + очікувані вихідні токени)
+OPENAI_TOKENS_PER_MINUTE = 200_000
+
+# Пакетний переклад Google: абзаци склеюються невидимим роздільником в один запит
+# (ліміт Google — 5000 символів на запит).
+GOOGLE_BATCH_CHARS = 4500
+_GOOGLE_BATCH_SEPARATOR = "\n\u2063\n"
+_GOOGLE_BATCH_SPLIT_RE = re.compile(r"\s*\u2063\s*")
+
+# Google Cloud Translation v3 (необов'язково, потрібен пакет google-cloud-translate).
+# Вмикається, якщо задано ідентифікатор проєкту; інакше — безкоштовний endpoint.
+try:
+    GOOGLE_CLOUD_PROJECT = st.secrets["GOOGLE_CLOUD_PROJECT"]
+except Exception:
+    GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
 
-def extract_text_from_docx(file_path: str):
-    """Витягує текст із DOCX-файлу, повертає список абзаців."""
-    doc = docx.Document(file_path)
-    return [para.text.strip() for para in doc.paragraphs if para.text.strip()]
+# Ліміти одного запиту translate_text у v3: 1024 рядки, ~30 000 символів
+GOOGLE_CLOUD_BATCH_ITEMS = 1024
+GOOGLE_CLOUD_BATCH_CHARS = 30000
 
+# Розмір пакета для застосунку залежить від того, який сервіс Google використовується
+GOOGLE_PACK_CHARS = GOOGLE_CLOUD_BATCH_CHARS if GOOGLE_CLOUD_PROJECT else GOOGLE_BATCH_CHARS
 
-def extract_text_from_pdf(file_path: str):
-    """Витягує текст із PDF-файлу, повертає список абзаців."""
-    doc = fitz.open(file_path)
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text("text") + "\n"
-    return [line.strip() for line in full_text.splitlines() if line.strip()]
+# Тексти-заглушки для невдалих перекладів (ніколи не потрапляють у кеш)
+GOOGLE_ERROR_TEXT = "Помилка перекладу (Google)"
+OPENAI_ERROR_TEXT = "Помилка перекладу (AI)"
+OPENAI_PARSE_ERROR_TEXT = "Помилка: не вдалося розпарсити відповідь GPT"
+_ERROR_TEXTS = {GOOGLE_ERROR_TEXT, OPENAI_ERROR_TEXT, OPENAI_PARSE_ERROR_TEXT}
 
+# Тимчасові помилки (ліміти, мережа, збої сервера), після яких є сенс повторити запит;
+# решта (некоректний текст, авторизація) повторюватись не буде.
+_GOOGLE_RETRYABLE_ERRORS = (requests.exceptions.RequestException,)
+_OPENAI_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
 
-def extract_text_from_html(url: str):
-    """Екстрагує текст із веб-сторінки, повертає список абзаців."""
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise Exception(f"Не вдалося завантажити сторінку: {url}")
+# --- ОБМЕЖЕННЯ ЧАСТОТИ ЗАПИТІВ ---
 
-    soup = BeautifulSoup(response.content, "html.parser")
-    paragraphs = soup.find_all("p")
-    return [para.get_text().strip() for para in paragraphs if para.get_text().strip()]
+class RateLimiter:
+    """
+    Потокобезпечний обмежувач частоти запитів: рівномірно розподіляє виклики acquire()
+    так, щоб їх було не більше rps на секунду, замість пакетних сплесків.
+    """
 
+    def __init__(self, rps: float):
+        self.lock = threading.Lock()
+        self.next = 0.0
+        self.interval = 1.0 / rps
 
-def extract_text(source: str):
-    """Визначає тип джерела (PDF, DOCX, URL) і повертає список абзаців."""
-    if source.startswith("http"):
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.next - now)
+            self.next = max(now, self.next) + self.interval
+        if wait:
+            time.sleep(wait)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Експоненційна затримка з випадковим розкидом (jitter), не більше 30 с."""
+    return min(2 ** attempt + random.uniform(0, 1), 30)
+
+
+google_limiter = RateLimiter(rps=GOOGLE_REQUESTS_PER_SECOND)
+openai_limiter = RateLimiter(rps=OPENAI_REQUESTS_PER_SECOND)
+
+
+class TokenBucket:
+    """
+    Потокобезпечний бюджет токенів на хвилину: запит чекає, доки бюджет не поповниться,
+    замість того щоб отримати 429 і марнувати час на повторні спроби.
+    """
+
+    def __init__(self, per_minute: int):
+        self.lock = threading.Lock()
+        self.capacity = per_minute
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def acquire(self, amount: int):
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            # Бюджет може піти в мінус: наступні запити чекатимуть довше
+            self.available -= amount
+            wait = max(0.0, -self.available / self.rate)
+        if wait:
+            time.sleep(wait)
+
+
+openai_token_bucket = TokenBucket(per_minute=OPENAI_TOKENS_PER_MINUTE)
+
+
+# --- КЕШ ПЕРЕКЛАДІВ ---
+# Переклади зберігаються в SQLite між запусками, ключ — хеш від сервісу, моделі, мов і тексту.
+CACHE_PATH = os.path.join("temp", "trans_cache.sqlite3")
+CACHE_TTL = 7 * 24 * 3600
+# Вимикається прапорцем --no-cache у CLI (наприклад, щоб отримати свіжі переклади)
+CACHE_ENABLED = True
+
+_cache_lock = threading.Lock()
+_cache_conn = None
+
+
+def _get_cache_conn():
+    """
+    Відкриває з'єднання з SQLite-кешем при першому зверненні (одне на процес)
+    і видаляє прострочені записи, щоб файл кешу не ріс безмежно.
+    """
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _cache_conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        _cache_conn.execute("DELETE FROM translations WHERE expires <= ?", (time.time(),))
+        _cache_conn.commit()
+    return _cache_conn
+
+
+def _normalize_for_cache(text: str) -> str:
+    """
+    Нормалізує текст для ключа кешу: NFKC (лігатури й повноширинні символи з PDF)
+    та згортання пробілів, щоб майже однакові абзаци з різних завантажень збігалися.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def _cache_key(provider: str, model: str, text: str, src: str = "en", tgt: str = "uk") -> str:
+    text = _normalize_for_cache(text)
+    return hashlib.blake2b(f"{provider}|{model}|{src}|{tgt}|{text}".encode(), digest_size=16).hexdigest()
+
+
+def cache_get(provider: str, model: str, text: str):
+    """Повертає переклад із кешу або None, якщо запису немає чи він застарів."""
+    if not CACHE_ENABLED:
+        return None
+    key = _cache_key(provider, model, text)
+    try:
+        with _cache_lock:
+            row = _get_cache_conn().execute(
+                "SELECT value FROM translations WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+    except sqlite3.Error as e:
+        logging.warning(f"Помилка читання кешу перекладів: {e}")
+        return None
+    return row[0] if row else None
+
+
+def cache_set(provider: str, model: str, text: str, value: str):
+    """Зберігає успішний переклад у кеш."""
+    if not CACHE_ENABLED or not value or value in _ERROR_TEXTS:
+        return
+    key = _cache_key(provider, model, text)
+    try:
+        with _cache_lock:
+            conn = _get_cache_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO translations (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + CACHE_TTL),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logging.warning(f"Помилка запису в кеш перекладів: {e}")
+
+
+def get_cached_translations(provider: str, paragraphs):
+    """
+    Повертає список перекладів із кешу для кожного абзацу (None — якщо в кеші немає);
+    тривіальні абзаци повертаються без змін.
+    provider: "google" або "openai".
+    """
+    model = OPENAI_MODEL if provider == "openai" else "google"
+    # Тривіальні абзаци не перекладаються, тому для них «перекладом» є сам текст
+    return [p if is_trivial_paragraph(p) else cache_get(provider, model, p) for p in paragraphs]
+
+# PDF від такої кількості сторінок розбирається паралельно в кількох процесах
+# (по одному процесу на кожні PDF_PARALLEL_MIN_PAGES сторінок, не більше кількості ядер).
+PDF_PARALLEL_MIN_PAGES = 100
+
+# Максимальний розмір веб-сторінки, яку завантажуємо для перекладу
+HTML_MAX_BYTES = 32 * 1024 * 1024
+
+# --- HTTP-СЕСІЯ (ВЕБ-СТОРІНКИ ТА GOOGLE TRANSLATE) ---
+# Одна сесія з пулом з'єднань: keep-alive замість нового TCP/TLS-рукостискання на кожен запит.
+_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+)
+_SESSION.mount("https://", _HTTP_ADAPTER)
+_SESSION.mount("http://", _HTTP_ADAPTER)
+# Для Google Translate повтори urllib3 вимкнено: їх робить translate_text_google /
+# _translate_google_pack через google_limiter, інакше вони множилися б і обходили ліміт.
+_SESSION.mount("https://translate.googleapis.com/", HTTPAdapter(pool_connections=1, pool_maxsize=32, max_retries=0))
+
+
+# --- ДОПОМІЖНІ ФУНКЦІЇ ДЛЯ ТЕКСТУ ---
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY, _W_P, _W_TBL, _W_R = _W_NS + "body", _W_NS + "p", _W_NS + "tbl", _W_NS + "r"
+_W_T, _W_TAB, _W_BR, _W_CR = _W_NS + "t", _W_NS + "tab", _W_NS + "br", _W_NS + "cr"
+_W_HYPERLINK, _W_INS = _W_NS + "hyperlink", _W_NS + "ins"
+_W_PTAB, _W_NO_BREAK_HYPHEN, _W_TYPE = _W_NS + "ptab", _W_NS + "noBreakHyphen", _W_NS + "type"
+
+
+def extract_text_from_docx(source):
+    """
+    Витягує текст із DOCX (шлях або файловий об'єкт), повертає список абзаців.
+    word/document.xml читається потоково через iterparse без побудови об'єктної моделі python-docx;
+    як і doc.paragraphs, беруться лише абзаци верхнього рівня тіла документа, а текст абзацу
+    збігається з Paragraph.text, крім того, що враховуються й відстежені вставки (w:ins).
+    """
+    paragraphs = []
+    with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as xml:
+        for _, el in etree.iterparse(xml, events=("end",), tag=(_W_P, _W_TBL)):
+            parent = el.getparent()
+            if parent is None or parent.tag != _W_BODY:
+                continue
+            if el.tag == _W_P:
+                parts = []
+                # Лише прогони самого абзацу (і гіперпосилань/вставок у ньому): текст написів
+                # (w:drawing, w:pict, mc:AlternateContent) не належить абзацу і дублюється у Fallback
+                for child in el:
+                    if child.tag == _W_R:
+                        runs = (child,)
+                    elif child.tag in (_W_HYPERLINK, _W_INS):
+                        runs = child.iterchildren(_W_R)
+                    else:
+                        continue
+                    for run in runs:
+                        for node in run.iterchildren(_W_T, _W_TAB, _W_PTAB, _W_BR, _W_CR, _W_NO_BREAK_HYPHEN):
+                            if node.tag == _W_T:
+                                parts.append(node.text or "")
+                            elif node.tag in (_W_TAB, _W_PTAB):
+                                parts.append("\t")
+                            elif node.tag == _W_NO_BREAK_HYPHEN:
+                                parts.append("-")
+                            elif node.tag == _W_CR or node.get(_W_TYPE, "textWrapping") == "textWrapping":
+                                # Розриви сторінки й колонки, як і в python-docx, тексту не дають
+                                parts.append("\n")
+                text = "".join(parts).strip()
+                if text:
+                    paragraphs.append(text)
+            # Звільняємо пам'ять від уже оброблених елементів
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+    return paragraphs
+
+
+def _open_pdf(source):
+    """Відкриває PDF за шляхом або з байтів у пам'яті."""
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _pdf_paragraphs(doc, page_numbers):
+    paragraphs = []
+    for page_no in page_numbers:
+        for block in doc[page_no].get_text("blocks"):
+            # block = (x0, y0, x1, y1, text, block_no, block_type); 0 — текстовий блок.
+            # Блок — це абзац: переноси рядків усередині нього замінюються пробілами,
+            # щоб речення не розривались між рядками таблиці перекладу.
+            if block[6] == 0:
+                text = " ".join(block[4].split())
+                if text:
+                    paragraphs.append(text)
+    return paragraphs
+
+
+def _extract_pdf_pages(source, start, stop):
+    """Витягує абзаци зі сторінок [start, stop) — виконується в окремому процесі."""
+    with _open_pdf(source) as doc:
+        return _pdf_paragraphs(doc, range(start, stop))
+
+
+def extract_text_from_pdf(source):
+    """
+    Витягує текст із PDF (шлях або файловий об'єкт), повертає список абзаців.
+    Великі PDF (від PDF_PARALLEL_MIN_PAGES сторінок) розбираються частинами в кількох процесах.
+    """
+    if hasattr(source, "read"):
+        source = source.read()
+    # Контекстний менеджер закриває документ MuPDF навіть у разі помилки розбору
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+        workers = min(os.cpu_count() or 1, -(-page_count // PDF_PARALLEL_MIN_PAGES))
+        if workers < 2:
+            return _pdf_paragraphs(doc, range(page_count))
+
+    step = -(-page_count // workers)
+    starts = list(range(0, page_count, step))
+    stops = [min(start + step, page_count) for start in starts]
+    # Процесам передається шлях, а не байти: інакше кожен отримав би власну копію всього PDF
+    temp_path = None
+    if isinstance(source, bytes):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+            temp_file.write(source)
+        temp_path = temp_file.name
+    try:
+        # spawn замість fork: fork у багатопотоковому сервері Streamlit може успадкувати
+        # захоплені іншими потоками блокування (зокрема всередині MuPDF) і зависнути
+        with ProcessPoolExecutor(max_workers=len(starts), mp_context=multiprocessing.get_context("spawn")) as executor:
+            parts = list(executor.map(_extract_pdf_pages, [temp_path or source] * len(starts), starts, stops))
+    except Exception as e:
+        logging.warning(f"Паралельний розбір PDF не вдався, розбираємо послідовно: {e}")
+        parts = [_extract_pdf_pages(source, 0, page_count)]
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+    return [para for part in parts for para in part]
+
+
+def extract_text_from_html(url: str):
+    """Екстрагує текст із веб-сторінки, повертає список абзаців."""
+    # stream=True: тіло сторінки читається частинами з обмеженням розміру
+    # і не завантажується взагалі, якщо сервер повернув помилку
+    with _SESSION.get(url, timeout=(5, 30), stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(f"Не вдалося завантажити сторінку: {url}")
+        parts = []
+        total = 0
+        for part in response.iter_content(64 * 1024):
+            total += len(part)
+            if total > HTML_MAX_BYTES:
+                raise Exception(f"Сторінка завелика (понад {HTML_MAX_BYTES // (1024 * 1024)} МБ): {url}")
+            parts.append(part)
+        content = b"".join(parts)
+
+    if LexborHTMLParser is not None:
+        # encoding=True: кодування визначається за байтами та <meta charset>
+        tree = LexborHTMLParser(content, encoding=True)
+        texts = (node.text().strip() for node in tree.css("p"))
+        return [text for text in texts if text]
+
+    # SoupStrainer: у дерево потрапляють лише <p>, решта розмітки пропускається
+    soup = BeautifulSoup(content, "lxml", parse_only=SoupStrainer("p"))
+    texts = (para.get_text().strip() for para in soup.find_all("p"))
+    return [text for text in texts if text]
+
+
+def extract_text(source, filename: str = None):
+    """
+    Визначає тип джерела (PDF, DOCX, URL) і повертає список абзаців.
+    source — URL, шлях до файлу або файловий об'єкт (наприклад, io.BytesIO);
+    для файлового об'єкта тип визначається за розширенням filename.
+    """
+    if hasattr(source, "read"):
+        name = (filename or "").lower()
+    elif source.startswith("http"):
         logging.info("Джерело визначено як веб-сторінка.")
         return extract_text_from_html(source)
-    elif source.endswith(".pdf"):
+    else:
+        name = source.lower()
+
+    if name.endswith(".pdf"):
         logging.info("Джерело визначено як PDF-файл.")
         return extract_text_from_pdf(source)
-    elif source.endswith(".docx"):
+    elif name.endswith(".docx"):
         logging.info("Джерело визначено як DOCX-файл.")
         return extract_text_from_docx(source)
     else:
         raise ValueError("Формат файлу не підтримується. Підтримуються DOCX, PDF або URL.")
 
 
+# Таблиця заміни недопустимих символів імені файлу (str.translate без regex)
+_SANITIZE_TABLE = str.maketrans({c: "_" for c in '<>:"/\\|?*\0'})
+
+
 def sanitize_filename(filename: str) -> str:
     """Очищає ім'я файлу від недопустимих символів."""
     name, ext = os.path.splitext(filename)
-    return re.sub(r'[<>:"/\\|?*]', '_', name) + ext
+    return name.translate(_SANITIZE_TABLE).strip()[:200] + ext
+
+
+def deduplicate_paragraphs(paragraphs):
+    """
+    Прибирає повтори абзаців перед перекладом.
+    Повертає (список унікальних абзаців, індекс унікального абзацу для кожного вихідного).
+    """
+    unique = {}
+    index_map = []
+    for p in paragraphs:
+        index_map.append(unique.setdefault(p, len(unique)))
+    return list(unique), index_map
+
+
+# Абзаци лише з цифр, розділових знаків і пробілів (номери статей, дати, роздільники)
+_TRIVIAL_RE = re.compile(r"^[\W\d\s]+$")
+
+
+def is_trivial_paragraph(text: str) -> bool:
+    """Абзац, який немає сенсу перекладати: він переноситься в переклад без змін."""
+    return len(text) < 3 or _TRIVIAL_RE.match(text) is not None
+
+
+# Публічний JSON-endpoint Google Translate (той самий, що використовують розширення браузера)
+GOOGLE_TRANSLATE_URL = "https://translate.googleapis.com/translate_a/single"
+
+
+def _google_translate_request(text: str) -> str:
+    """
+    Один запит до Google Translate через спільну сесію з пулом з'єднань.
+    429 і 5xx піднімають requests.HTTPError (тимчасова помилка), інші коди і тіло не у форматі JSON
+    (наприклад, сторінка з капчею) — Exception.
+    """
+    response = _SESSION.post(
+        GOOGLE_TRANSLATE_URL,
+        params={"client": "gtx", "sl": "en", "tl": "uk", "dt": "t"},
+        data={"q": text},
+        timeout=(5, 30),
+    )
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    if response.status_code != 200:
+        raise Exception(f"Google Translate повернув HTTP {response.status_code}")
+    # requests.JSONDecodeError є RequestException, тому без перетворення його б повторювали
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise Exception(f"Google Translate повернув не JSON: {e}") from None
+    # Відповідь: [[["переклад речення", "оригінал", ...], ...], ...]
+    return "".join(segment[0] for segment in data[0] or [] if segment and segment[0])
 
 
 def translate_text_google(text: str, max_retries=3) -> str:
-    """Переклад одного абзацу через Google (deep_translator)."""
+    """Переклад одного абзацу через Google Translate."""
+    if is_trivial_paragraph(text):
+        return text
+    cached = cache_get("google", "google", text)
+    if cached is not None:
+        return cached
+
     for attempt in range(max_retries):
         try:
-            return GoogleTranslator(source='en', target='uk').translate(text)
-        except Exception as e:
+            google_limiter.acquire()
+            result = _google_translate_request(text)
+            cache_set("google", "google", text, result)
+            return result
+        except _GOOGLE_RETRYABLE_ERRORS as e:
             logging.warning(f"Google Translator Error (attempt {attempt+1}/{max_retries}): {e}")
-            time.sleep(2 ** attempt)
-    return "Помилка перекладу (Google)"
+            if attempt < max_retries - 1:
+                time.sleep(_backoff_delay(attempt))
+        except Exception as e:
+            logging.error(f"Google Translator Error (без повтору): {e}")
+            break
+    return GOOGLE_ERROR_TEXT
+
+
+def pack_paragraphs(paragraphs, max_chars=GOOGLE_BATCH_CHARS, max_items=None):
+    """
+    Групує абзаци в пакети для Google так, щоб склеєний текст не перевищував max_chars
+    (і, за потреби, пакет містив не більше max_items абзаців).
+    Повертає список пакетів, кожен пакет — список індексів абзаців.
+    """
+    packs = []
+    current, size = [], 0
+    for i, para in enumerate(paragraphs):
+        extra = len(para) + (len(_GOOGLE_BATCH_SEPARATOR) if current else 0)
+        if current and (size + extra > max_chars or len(current) == max_items):
+            packs.append(current)
+            current, size = [], 0
+            extra = len(para)
+        current.append(i)
+        size += extra
+    if current:
+        packs.append(current)
+    return packs
+
+
+def translate_batch_google(paragraphs, batch_chars=GOOGLE_BATCH_CHARS, max_retries=3):
+    """
+    Переклад списку абзаців через Google пакетами: один HTTP-запит на пакет.
+    Якщо відповідь не вдається розділити на ту саму кількість абзаців,
+    пакет перекладається по одному абзацу.
+    Якщо налаштовано GOOGLE_CLOUD_PROJECT, спершу використовується Cloud Translation v3.
+    Абзаци, переклад яких уже є в кеші, і тривіальні абзаци не надсилаються.
+    """
+    results = get_cached_translations("google", paragraphs)
+    todo = [i for i, t in enumerate(results) if t is None]
+    if not todo:
+        return results
+    pending = [paragraphs[i] for i in todo]
+
+    translated = None
+    if GOOGLE_CLOUD_PROJECT:
+        try:
+            translated = translate_batch_google_cloud(pending)
+        except Exception as e:
+            logging.warning(f"Google Cloud Translation недоступний, використовуємо безкоштовний endpoint: {e}")
+
+    if translated is None:
+        translated = []
+        for pack in pack_paragraphs(pending, max_chars=batch_chars):
+            translated.extend(_translate_google_pack([pending[i] for i in pack], max_retries))
+
+    for i, translation in zip(todo, translated):
+        results[i] = translation
+    return results
+
+
+@functools.lru_cache(maxsize=1)
+def _get_cloud_translate_client():
+    from google.cloud import translate_v3
+    return translate_v3.TranslationServiceClient()
+
+
+def translate_batch_google_cloud(paragraphs, project_id=None):
+    """
+    Переклад через Google Cloud Translation v3: до 1024 абзаців в одному запиті.
+    Потребує пакета google-cloud-translate і облікових даних Google Cloud.
+    """
+    project_id = project_id or GOOGLE_CLOUD_PROJECT
+    client = _get_cloud_translate_client()
+    parent = f"projects/{project_id}/locations/global"
+
+    results = []
+    for pack in pack_paragraphs(paragraphs, max_chars=GOOGLE_CLOUD_BATCH_CHARS, max_items=GOOGLE_CLOUD_BATCH_ITEMS):
+        contents = [paragraphs[i] for i in pack]
+        response = client.translate_text(
+            request={
+                "parent": parent,
+                "contents": contents,
+                "mime_type": "text/plain",
+                "source_language_code": "en",
+                "target_language_code": "uk",
+            }
+        )
+        translations = [t.translated_text for t in response.translations]
+        for para, translation in zip(contents, translations):
+            cache_set("google", "google", para, translation)
+        results.extend(translations)
+    return results
+
+
+def _translate_google_pack(pack, max_retries=3):
+    if len(pack) == 1:
+        return [translate_text_google(pack[0], max_retries)]
+
+    joined = _GOOGLE_BATCH_SEPARATOR.join(pack)
+    for attempt in range(max_retries):
+        try:
+            google_limiter.acquire()
+            result = _google_translate_request(joined)
+        except _GOOGLE_RETRYABLE_ERRORS as e:
+            logging.warning(f"Google Translator Error (batch, attempt {attempt+1}/{max_retries}): {e}")
+            if attempt < max_retries - 1:
+                time.sleep(_backoff_delay(attempt))
+            continue
+        except Exception as e:
+            # Помилка не тимчасова (наприклад, некоректний текст) — одразу перекладаємо по одному абзацу
+            logging.warning(f"Google Translator Error (batch): {e}")
+            break
+
+        parts = [part.strip() for part in _GOOGLE_BATCH_SPLIT_RE.split(result or "")]
+        if len(parts) == len(pack):
+            for para, translation in zip(pack, parts):
+                cache_set("google", "google", para, translation)
+            return parts
+        logging.warning(
+            f"Google повернув {len(parts)} частин замість {len(pack)}. Перекладаємо пакет по одному абзацу."
+        )
+        break
+
+    return [translate_text_google(para, max_retries) for para in pack]
 
 
 # -------------------- OPENAI LOGIC --------------------
 
-def chunk_paragraphs(paragraphs, chunk_size=5):
+@functools.lru_cache(maxsize=1)
+def _get_token_encoder():
+    """Токенізатор tiktoken для моделі OpenAI або None, якщо він недоступний."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(OPENAI_MODEL.split("/")[-1])
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken недоступний, кількість токенів оцінюється за довжиною тексту: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Кількість токенів у тексті (приблизно 4 символи на токен без tiktoken)."""
+    encoder = _get_token_encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def chunk_paragraphs(paragraphs, max_tokens=OPENAI_CHUNK_TOKENS, max_items=OPENAI_CHUNK_MAX_ITEMS):
     """
-    Розбиває список абзаців на шматки (chunk) по chunk_size.
+    Розбиває список абзаців на шматки (chunk) за бюджетом токенів:
+    короткі абзаци об'єднуються в один запит, довгий абзац іде окремим шматком.
     Повертає генератор списків (кожен список — це пакет абзаців).
     """
-    for i in range(0, len(paragraphs), chunk_size):
-        yield paragraphs[i : i+chunk_size]
+    buf, n = [], 0
+    for p in paragraphs:
+        t = count_tokens(p)
+        if buf and (n + t > max_tokens or len(buf) >= max_items):
+            yield buf
+            buf, n = [], 0
+        buf.append(p)
+        n += t
+    if buf:
+        yield buf
+
+
+# Межа речення: пробіли після . ! ? ; (для поділу надто довгих абзаців)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+
+
+def _split_long_paragraph(text: str, max_tokens=OPENAI_CHUNK_TOKENS):
+    """Ділить надто довгий абзац за межами речень на частини, що вкладаються в max_tokens."""
+    sentences = _SENTENCE_END_RE.split(text)
+    return [" ".join(part) for part in chunk_paragraphs(sentences, max_tokens=max_tokens, max_items=len(sentences))]
+
+
+_NUM_LINE_RE = re.compile(r"^[ \t]*\d+\)[ \t]*", re.MULTILINE)
+
+
+def _parse_numbered_response(result_text: str):
+    """
+    Розбирає відповідь виду "1) ...\n2) ..." на список перекладів за один прохід:
+    текст між сусідніми номерами (разом із рядками-продовженнями) — один абзац.
+    Якщо нумерації немає, уся відповідь вважається одним абзацом.
+    """
+    markers = list(_NUM_LINE_RE.finditer(result_text))
+    if not markers:
+        text = " ".join(result_text.split())
+        return [text] if text else []
+
+    ends = [m.start() for m in markers[1:]] + [len(result_text)]
+    return [" ".join(result_text[m.end():end].split()) for m, end in zip(markers, ends)]
+
+
+def _parse_json_response(result_text: str, count: int):
+    """
+    Розбирає JSON-відповідь виду {"1": "...", "2": "..."} у список із count перекладів;
+    для відсутніх ключів у списку стоїть порожній рядок. Приймається також форма
+    {"translations": [...]}, якщо довжина списку збігається з count.
+    Якщо відповідь не є JSON-об'єктом, повертає None.
+    """
+    try:
+        data = json.loads(result_text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    translations = data.get("translations")
+    if isinstance(translations, list) and len(translations) == count:
+        return [str(t or "").strip() for t in translations]
+    return [str(data.get(str(i)) or "").strip() for i in range(1, count + 1)]
+
+
+def _build_openai_prompt(paragraph_chunk):
+    """Нумерований список абзаців для запиту до моделі."""
+    return "\n".join(f"{i}) {para}" for i, para in enumerate(paragraph_chunk, start=1))
+
+
+def _openai_messages(prompt_text):
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert translator. You will receive a numbered list of paragraphs in English. Your task is to translate them into Ukrainian. Return ONLY a JSON object {\"1\": \"<Ukrainian translation>\", \"2\": ...} with exactly one key per input paragraph, keyed by its number. Do not add any extra text, explanations, or greetings."
+        },
+        {
+            "role": "user",
+            "content": prompt_text
+        },
+    ]
+
+
+def _max_completion_tokens(prompt_tokens: int) -> int:
+    """Ліміт вихідних токенів для запиту з prompt_tokens вхідними токенами."""
+    answer_tokens = max(256, int(prompt_tokens * OPENAI_COMPLETION_TOKENS_RATIO))
+    return min(OPENAI_MAX_COMPLETION_TOKENS, answer_tokens + OPENAI_REASONING_TOKENS)
+
+
+def _request_openai_chat(model, prompt_text, max_retries=3):
+    """
+    Надсилає запит на переклад до OpenRouter і повертає текст відповіді.
+    При перевищенні ліміту запитів (429), мережевій помилці чи збої сервера повторює спробу
+    з експоненційною затримкою та випадковим розкидом (jitter); інші помилки не повторюються.
+    Відповідь, обрізану лімітом вихідних токенів, один раз запитує повторно
+    з лімітом OPENAI_MAX_COMPLETION_TOKENS.
+    """
+    prompt_tokens = count_tokens(prompt_text)
+    max_completion_tokens = _max_completion_tokens(prompt_tokens)
+    attempt = 0
+    while True:
+        # Резервуємо запит і найгірший випадок відповіді: ліміт вихідних токенів
+        # уже включає запас на міркування моделі (OPENAI_REASONING_TOKENS)
+        needed_tokens = prompt_tokens + max_completion_tokens
+        try:
+            openai_limiter.acquire()
+            openai_token_bucket.acquire(needed_tokens)
+            response = client.chat.completions.create(
+                model=model,
+                messages=_openai_messages(prompt_text),
+                response_format={"type": "json_object"},
+                max_completion_tokens=max_completion_tokens,
+                extra_headers={
+                    "HTTP-Referer": "https://legaltransua.streamlit.app/",
+                    "X-Title": "LegalTransUA"
+                }
+            )
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                # Обрізана відповідь — неповний JSON, тому не повертаємо її як переклад
+                if max_completion_tokens >= OPENAI_MAX_COMPLETION_TOKENS:
+                    raise Exception(f"Відповідь OpenRouter обрізано лімітом max_completion_tokens={max_completion_tokens}")
+                logging.warning(
+                    f"Відповідь OpenRouter обрізано лімітом max_completion_tokens={max_completion_tokens}, "
+                    f"повторюємо з лімітом {OPENAI_MAX_COMPLETION_TOKENS}"
+                )
+                max_completion_tokens = OPENAI_MAX_COMPLETION_TOKENS
+                continue
+            return (choice.message.content or "").strip()
+        except _OPENAI_RETRYABLE_ERRORS as e:
+            if attempt == max_retries - 1:
+                raise
+            logging.warning(f"OpenRouter Rate Limit/Timeout (attempt {attempt+1}/{max_retries}): {e}")
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+
+
+def _finalize_openai_result(paragraph_chunk, result_text, model):
+    """
+    Розбирає відповідь моделі для шматка абзаців, кешує переклади і повертає
+    рівно len(paragraph_chunk) рядків (нерозібрані абзаци — текст помилки).
+    """
+    parsed = _parse_json_response(result_text, len(paragraph_chunk))
+    if parsed is not None:
+        # Відповідь прив'язана до номерів абзаців, тому кешуємо кожен отриманий переклад
+        for para, translation in zip(paragraph_chunk, parsed):
+            cache_set("openai", model, para, translation)
+        return [translation or OPENAI_PARSE_ERROR_TEXT for translation in parsed]
+
+    # Модель відповіла не JSON — розбираємо як нумерований список, але лише за наявності
+    # номерів: інакше це, найімовірніше, обірваний JSON, і переклад з нього брати не можна
+    if not _NUM_LINE_RE.search(result_text):
+        logging.error(f"Відповідь моделі не є ні JSON, ні нумерованим списком: {result_text[:200]!r}")
+        return [OPENAI_PARSE_ERROR_TEXT] * len(paragraph_chunk)
+
+    chunk_result = _parse_numbered_response(result_text)
+    logging.info(f"Після розбору знайдено {len(chunk_result)} перекладених абзаців.")
+
+    # Кешуємо лише тоді, коли відповідь розібрано повністю
+    if len(chunk_result) >= len(paragraph_chunk):
+        for para, translation in zip(paragraph_chunk, chunk_result):
+            cache_set("openai", model, para, translation)
+
+    while len(chunk_result) < len(paragraph_chunk):
+        chunk_result.append(OPENAI_PARSE_ERROR_TEXT)
+
+    chunk_result = chunk_result[: len(paragraph_chunk)]
 
+    return chunk_result
 
-def translate_chunk_openai(paragraph_chunk):
+
+def translate_chunk_openai(paragraph_chunk, max_retries=3, max_tokens=OPENAI_CHUNK_TOKENS):
     """
     Викликає OpenAI (через OpenRouter) для кількох абзаців за раз.
+    Абзац, довший за max_tokens (бюджет шматка), перекладається частинами по реченнях.
     """
     if not paragraph_chunk:
         return []
 
-    prompt_text = ""
-    for i, para in enumerate(paragraph_chunk, start=1):
-        prompt_text += f"{i}) {para}\n"
-    
-    # Використовуємо модель OpenRouter (з префіксом виробника)
-    model_to_use = "openai/gpt-5-mini"
+    chunk_result = get_cached_translations("openai", paragraph_chunk)
+    todo = [i for i, t in enumerate(chunk_result) if t is None]
+    if len(todo) < len(paragraph_chunk):
+        # Тривіальні абзаци і абзаци з кешу не потрапляють у запит і повертаються на свої місця
+        if todo:
+            translated = translate_chunk_openai([paragraph_chunk[i] for i in todo], max_retries, max_tokens)
+            for i, translation in zip(todo, translated):
+                chunk_result[i] = translation
+        return chunk_result
+
+    # Абзац, більший за бюджет шматка, перекладається частинами по реченнях
+    if len(paragraph_chunk) == 1 and count_tokens(paragraph_chunk[0]) > max_tokens:
+        pieces = _split_long_paragraph(paragraph_chunk[0], max_tokens)
+        if len(pieces) > 1:
+            translated = []
+            for piece_chunk in chunk_paragraphs(pieces, max_tokens=max_tokens):
+                translated.extend(translate_chunk_openai(piece_chunk, max_retries, max_tokens))
+            errors = [t for t in translated if t in _ERROR_TEXTS]
+            if errors:
+                return [errors[0]]
+            translation = " ".join(translated)
+            cache_set("openai", OPENAI_MODEL, paragraph_chunk[0], translation)
+            return [translation]
+
+    prompt_text = _build_openai_prompt(paragraph_chunk)
     
+    model_to_use = OPENAI_MODEL
+
     logging.info(f"--- ВІДПРАВКА ЗАПИТУ ДО OPENROUTER ---")
     logging.info(f"Модель: {model_to_use}")
 
     try:
-        response = client.chat.completions.create(
-            model=model_to_use,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert translator. You will receive a numbered list of paragraphs in English. Your task is to translate them into Ukrainian. Your response MUST contain ONLY the translated paragraphs, preserving the original numbering and order. Do not add any extra text, explanations, or greetings."
-                },
-                {
-                    "role": "user",
-                    "content": prompt_text
-                },
-            ],
-            extra_headers={
-                "HTTP-Referer": "https://legaltransua.streamlit.app/",
-                "X-Title": "LegalTransUA"
-            }
-        )
-        result_text = response.choices[0].message.content.strip()
+        result_text = _request_openai_chat(model_to_use, prompt_text, max_retries)
 
         logging.info(f"--- ОТРИМАНО УСПІШНУ ВІДПОВІДЬ ВІД OPENROUTER ---")
         if not result_text:
@@ -154,40 +916,98 @@ def translate_chunk_openai(paragraph_chunk):
     except Exception as e:
         logging.error(f"!!! ПОМИЛКА ЗАПИТУ ДО OPENROUTER !!!")
         logging.error(f"Повний текст помилки: {e}")
-        return ["Помилка перекладу (AI)"] * len(paragraph_chunk)
+        return [OPENAI_ERROR_TEXT] * len(paragraph_chunk)
 
-    # Парсинг відповіді
-    lines = result_text.splitlines()
-    chunk_result = []
-    current_translation = ""
-    
-    for line in lines:
-        line_stripped = line.strip()
-        if not line_stripped:
-            continue
-        
-        match = re.match(r"^\d+\)\s*(.*)", line_stripped)
-        
-        if match:
-            if current_translation:
-                chunk_result.append(current_translation.strip())
-            current_translation = match.group(1)
-        else:
-            current_translation += " " + line_stripped
+    return _finalize_openai_result(paragraph_chunk, result_text, model_to_use)
 
-    if current_translation:
-        chunk_result.append(current_translation.strip())
-        
-    logging.info(f"Після розбору знайдено {len(chunk_result)} перекладених абзаців.")
 
-    if not chunk_result and result_text:
-        logging.warning("Парсинг не дав результату, але текст існує. Спроба повернути сирий текст.")
-        chunk_result.append(result_text)
+@functools.lru_cache(maxsize=1)
+def _get_batch_client():
+    """
+    Прямий клієнт OpenAI для Batch API (OpenRouter його не підтримує).
+    На відміну від основного клієнта, вбудовані повтори SDK лишаються: для викликів
+    Batch API (завантаження файлів, створення й опитування пакета) власного циклу повторів немає.
+    """
+    try:
+        batch_key = st.secrets["OPENAI_BATCH_API_KEY"]
+    except Exception:
+        batch_key = os.getenv("OPENAI_BATCH_API_KEY")
+    if not batch_key:
+        raise RuntimeError("Для Batch API потрібен ключ OPENAI_BATCH_API_KEY.")
+    return openai.OpenAI(api_key=batch_key, http_client=_OPENAI_HTTP_CLIENT)
 
-    while len(chunk_result) < len(paragraph_chunk):
-        chunk_result.append("Помилка: не вдалося розпарсити відповідь GPT")
 
-    return chunk_result[: len(paragraph_chunk)]
+def translate_document_batch(paragraphs, max_tokens=OPENAI_CHUNK_TOKENS, poll_interval=OPENAI_BATCH_POLL_INTERVAL):
+    """
+    Перекладає абзаци через OpenAI Batch API: усі шматки записуються в один JSONL,
+    пакет обробляється асинхронно на боці OpenAI (до 24 год), результат зіставляється за custom_id.
+    Повертає список перекладів тієї ж довжини, що й paragraphs.
+    """
+    translations = get_cached_translations("openai", paragraphs)
+    pending = [i for i, t in enumerate(translations) if t is None]
+    if not pending:
+        return translations
+
+    chunks = []
+    start = 0
+    for chunk in chunk_paragraphs([paragraphs[i] for i in pending], max_tokens=max_tokens):
+        chunks.append(pending[start:start + len(chunk)])
+        start += len(chunk)
+
+    lines = []
+    for n, chunk in enumerate(chunks):
+        prompt_text = _build_openai_prompt([paragraphs[i] for i in chunk])
+        body = {
+            "model": OPENAI_BATCH_MODEL,
+            "messages": _openai_messages(prompt_text),
+            "response_format": {"type": "json_object"},
+            # Пакет не повторюється, тому обрізана відповідь коштувала б шматка перекладу:
+            # ліміт ставимо максимальний (оплачуються лише фактично згенеровані токени)
+            "max_completion_tokens": OPENAI_MAX_COMPLETION_TOKENS,
+        }
+        lines.append(json.dumps({"custom_id": f"chunk-{n}", "method": "POST", "url": "/v1/chat/completions", "body": body}, ensure_ascii=False))
+
+    batch_client = _get_batch_client()
+    input_file = batch_client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = batch_client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+    logging.info(f"OpenAI Batch {batch.id}: надіслано шматків {len(chunks)}.")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        try:
+            batch = batch_client.batches.retrieve(batch.id)
+        except _OPENAI_RETRYABLE_ERRORS as e:
+            # Пакет продовжує оброблятися на боці OpenAI, тому збій опитування не перериває очікування
+            logging.warning(f"OpenAI Batch {batch.id}: не вдалося отримати статус, повторимо: {e}")
+            continue
+        logging.info(f"OpenAI Batch {batch.id}: статус {batch.status}.")
+
+    results = {}
+    if batch.status == "completed" and batch.output_file_id:
+        for line in batch_client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                continue
+            choice = response["body"]["choices"][0]
+            if choice.get("finish_reason") == "length":
+                logging.error(f"OpenAI Batch {batch.id}: відповідь {record['custom_id']} обрізано лімітом токенів.")
+                continue
+            results[int(record["custom_id"].split("-")[1])] = choice["message"]["content"] or ""
+    else:
+        logging.error(f"OpenAI Batch {batch.id} завершився зі статусом {batch.status}.")
+
+    for n, chunk in enumerate(chunks):
+        if n in results:
+            # Кешуємо під основною моделлю, щоб переклади використовувались і без Batch API
+            chunk_result = _finalize_openai_result([paragraphs[i] for i in chunk], results[n].strip(), OPENAI_MODEL)
+        else:
+            chunk_result = [OPENAI_ERROR_TEXT] * len(chunk)
+        for i, translation in zip(chunk, chunk_result):
+            translations[i] = translation
+    return translations
 
 
 # -------------------- DOCX FORMATTING --------------------
@@ -212,69 +1032,93 @@ def add_title(doc: Document):
     paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
 
-def create_shading_element(color: str):
-    """Створює елемент заливки комірки в таблиці."""
-    shading = OxmlElement("w:shd")
-    shading.set(qn("w:val"), "clear")
-    shading.set(qn("w:color"), "auto")
-    shading.set(qn("w:fill"), color)
-    return shading
+@functools.lru_cache(maxsize=1)
+def _document_template() -> bytes:
+    """Порожній документ з горизонтальною орієнтацією та заголовком; будується один раз."""
+    doc = Document()
+    setup_document_orientation(doc)
+    add_title(doc)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def new_translation_document():
+    """Новий документ для результату перекладу, створений із кешованого шаблону."""
+    return Document(io.BytesIO(_document_template()))
+
+
+_XML_INVALID_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _table_cell_xml(text: str, width: int, fill_color: str = None, header: bool = False) -> str:
+    """
+    Повертає XML комірки таблиці: вирівнювання по ширині, шрифт 9 pt, необов'язкова заливка;
+    комірка заголовка — по центру, жирним шрифтом стандартного розміру.
+    """
+    shading = f'<w:shd w:val="clear" w:color="auto" w:fill="{fill_color}"/>' if fill_color else ""
+    alignment, run_props = ("center", "<w:b/>") if header else ("both", '<w:sz w:val="18"/>')
+    text = escape(_XML_INVALID_CHARS_RE.sub("", text))
+    text = text.replace("\t", '</w:t><w:tab/><w:t xml:space="preserve">')
+    text = text.replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+    return (
+        f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/>{shading}</w:tcPr>'
+        f'<w:p><w:pPr><w:jc w:val="{alignment}"/></w:pPr>'
+        f'<w:r><w:rPr>{run_props}</w:rPr><w:t xml:space="preserve">{text}</w:t></w:r></w:p></w:tc>'
+    )
 
 
 def create_translation_table(doc: Document, paragraphs, google_trans, openai_trans):
     """Створює таблицю порівняння."""
-    table = doc.add_table(rows=1, cols=4)
+    # python-docx створює лише порожню таблицю зі стилем і сіткою колонок;
+    # усі рядки (разом із заголовком) будуються одним XML-фрагментом.
+    table = doc.add_table(rows=0, cols=4)
     table.style = "Table Grid"
 
     headers = ["№", "Оригінальний текст", "Google Translate", "OpenAI GPT"]
     header_fill_color = "D9EAF7"
     row_number_fill_color = "E0E0E0"
 
-    # Заголовки
-    for idx, header in enumerate(headers):
-        cell = table.rows[0].cells[idx]
-        cell.text = header
-        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        cell.paragraphs[0].runs[0].font.bold = True
-        cell._element.get_or_add_tcPr().append(create_shading_element(header_fill_color))
-
-    # Рядки
-    for i, (para, g, o) in enumerate(zip(paragraphs, google_trans, openai_trans)):
-        row_cells = table.add_row().cells
-        row_cells[0].text = str(i + 1)
-        
-        # БЕЗПЕЧНИЙ ЗАПИС: якщо перекладу немає, ставимо порожній рядок
-        row_cells[1].text = str(para) if para else ""
-        row_cells[2].text = str(g) if g else "" 
-        row_cells[3].text = str(o) if o else ""
-
-        row_cells[0]._element.get_or_add_tcPr().append(create_shading_element(row_number_fill_color))
+    # Ширина колонок (у twips: 1 дюйм = 1440)
+    total_width = 10 * 1440
+    first_col_width = int(total_width * 0.05)
+    other_width = int((total_width - first_col_width) / 3.0)
 
-        for cell in row_cells:
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                for run in paragraph.runs:
-                    run.font.size = Pt(9)
+    col_widths = [first_col_width, other_width, other_width, other_width]
 
-    # Ширина колонок
-    total_width = Inches(10)
-    first_col_width = total_width * 0.05
-    other_width = (total_width - first_col_width) / 3.0
+    # Фіксована розмітка: ширини беруться лише з <w:tblGrid>, Word не перераховує
+    # ширини колонок за вмістом усіх комірок під час відкриття документа.
+    table.autofit = False
+    for grid_col, width in zip(table._tbl.tblGrid.gridCol_lst, col_widths):
+        grid_col.set(qn("w:w"), str(width))
 
-    col_widths = [first_col_width, other_width, other_width, other_width]
+    # Заголовки
+    header_xml = (
+        "<w:tr>"
+        + "".join(_table_cell_xml(header, width, header_fill_color, header=True) for header, width in zip(headers, col_widths))
+        + "</w:tr>"
+    )
 
-    for i, column in enumerate(table.columns):
-        for cell in column.cells:
-            cell.width = col_widths[i]
+    # Рядки: XML усіх рядків будується одним рядком і розбирається один раз,
+    # замість сотень викликів python-docx для кожної комірки.
+    rows_xml = "".join(
+        "<w:tr>"
+        + _table_cell_xml(str(i + 1), col_widths[0], row_number_fill_color)
+        # БЕЗПЕЧНИЙ ЗАПИС: якщо перекладу немає, ставимо порожній рядок
+        + _table_cell_xml(str(para) if para else "", col_widths[1])
+        + _table_cell_xml(str(g) if g else "", col_widths[2])
+        + _table_cell_xml(str(o) if o else "", col_widths[3])
+        + "</w:tr>"
+        for i, (para, g, o) in enumerate(zip(paragraphs, google_trans, openai_trans))
+    )
+    table._tbl.extend(list(parse_xml(f"<w:tbl {nsdecls('w')}>{header_xml}{rows_xml}</w:tbl>")))
 
     return doc
 
 
 def save_translation_document(source, paragraphs, google_trans, openai_trans):
     """Зберігає документ."""
-    doc = Document()
-    setup_document_orientation(doc)
-    add_title(doc)
+    doc = new_translation_document()
     doc.add_paragraph(f"Дата та час перекладу: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     create_translation_table(doc, paragraphs, google_trans, openai_trans)
@@ -289,17 +1133,25 @@ def save_translation_document(source, paragraphs, google_trans, openai_trans):
     output_filename = f"{base_name} (Translated by LTUA {timestamp_str}).docx"
 
     save_dir = "output"
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
+    os.makedirs(save_dir, exist_ok=True)
 
     output_path = os.path.join(save_dir, output_filename)
-    doc.save(output_path)
+    # Документ серіалізується в пам'ять і записується на диск одним викликом
+    buffer = io.BytesIO()
+    doc.save(buffer)
+
+    # Дерево великої таблиці звільняється одразу, а не при наступному проході збирача сміття
+    del doc
+    gc.collect()
+
+    with open(output_path, "wb") as f:
+        f.write(buffer.getbuffer())
     logging.info(f"Документ збережено: {output_path}")
 
     return output_path
 
 
-def process_document(source: str, openai_chunk_size=5):
+def process_document(source: str, openai_chunk_tokens=OPENAI_CHUNK_TOKENS, max_concurrent_requests=OPENAI_MAX_WORKERS, use_batch_api=False):
     """Основна логіка обробки."""
     paragraphs = extract_text(source)
     if not paragraphs:
@@ -308,31 +1160,40 @@ def process_document(source: str, openai_chunk_size=5):
 
     logging.info(f"Знайдено абзаців: {len(paragraphs)}")
 
-    # GOOGLE
-    google_translations = [""] * len(paragraphs)
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(translate_text_google, p): i for i, p in enumerate(paragraphs)}
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Google"):
-            idx = futures[future]
-            google_translations[idx] = future.result()
-
-    # OPENAI (OpenRouter)
-    openai_translations = [""] * len(paragraphs)
-    all_chunks = list(chunk_paragraphs(paragraphs, chunk_size=openai_chunk_size))
-    
-    processed_count = 0
-    total_paras = len(paragraphs)
+    # Перекладаємо лише унікальні абзаци, потім розкладаємо результати назад
+    unique_paragraphs, index_map = deduplicate_paragraphs(paragraphs)
+
+    # GOOGLE (пакетами: один запит на кілька абзаців)
+    google_translations = [""] * len(unique_paragraphs)
+    packs = pack_paragraphs(unique_paragraphs, max_chars=GOOGLE_PACK_CHARS)
 
-    for chunk_index, chunk in enumerate(all_chunks):
-        chunk_result = translate_chunk_openai(chunk)
-        
-        start_idx = chunk_index * openai_chunk_size
-        for i, translation in enumerate(chunk_result):
-            if start_idx + i < len(openai_translations):
-                openai_translations[start_idx + i] = translation
+    # OPENAI (OpenRouter): шматки перекладаються паралельно, не більше max_concurrent_requests одночасно
+    openai_translations = [""] * len(unique_paragraphs)
 
-        processed_count += len(chunk)
-        logging.info(f"OpenAI chunk {chunk_index+1}/{len(all_chunks)} готово.")
+    # Google та OpenAI незалежні, тому обидва етапи виконуються одночасно
+    with ThreadPoolExecutor(max_workers=GOOGLE_BATCH_WORKERS) as google_executor, ThreadPoolExecutor(max_workers=max_concurrent_requests) as openai_executor:
+        futures_g = {google_executor.submit(translate_batch_google, [unique_paragraphs[i] for i in pack]): pack for pack in packs}
+        if use_batch_api:
+            # OPENAI Batch API: дешевше, але результат може надійти лише за кілька годин
+            futures_o = {openai_executor.submit(translate_document_batch, unique_paragraphs, openai_chunk_tokens): (0, unique_paragraphs)}
+        else:
+            # Шматки надсилаються одразу під час нарізання, без проміжного списку
+            futures_o = {}
+            start_idx = 0
+            for chunk in chunk_paragraphs(unique_paragraphs, max_tokens=openai_chunk_tokens):
+                futures_o[openai_executor.submit(translate_chunk_openai, chunk, max_tokens=openai_chunk_tokens)] = (start_idx, chunk)
+                start_idx += len(chunk)
+
+        for future in tqdm(as_completed([*futures_g, *futures_o]), total=len(futures_g) + len(futures_o), desc="Google + OpenAI"):
+            if future in futures_g:
+                for i, translation in zip(futures_g[future], future.result()):
+                    google_translations[i] = translation
+            else:
+                start, chunk = futures_o[future]
+                openai_translations[start:start + len(chunk)] = future.result()[: len(chunk)]
+
+    google_translations = [google_translations[i] for i in index_map]
+    openai_translations = [openai_translations[i] for i in index_map]
 
     output_file = save_translation_document(
         source,
@@ -346,5 +1207,14 @@ def process_document(source: str, openai_chunk_size=5):
 
 if __name__ == "__main__":
     # Для локального тестування
-    source_path = input("Введіть URL або шлях до PDF/DOCX-файлу: ").strip()
-    process_document(source_path, openai_chunk_size=5)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Порівняльний переклад документа (Google + OpenAI).")
+    parser.add_argument("source", nargs="?", help="URL або шлях до PDF/DOCX-файлу")
+    parser.add_argument("--no-cache", action="store_true", help="не читати й не записувати кеш перекладів")
+    parser.add_argument("--batch", action="store_true", help="перекладати через OpenAI Batch API")
+    args = parser.parse_args()
+
+    CACHE_ENABLED = not args.no_cache
+    source_path = args.source or input("Введіть URL або шлях до PDF/DOCX-файлу: ").strip()
+    process_document(source_path, use_batch_api=args.batch)